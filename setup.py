@@ -45,6 +45,20 @@ with open ('README.rst') as f :
     for line in f :
         description.append (line)
 
+# Optionally compile the telegram parsing module with Cython in
+# pure-python mode: the parse hot path is interpreter-bound, the
+# compiled module is a drop-in replacement. Without Cython the plain
+# python module is used, nothing is required at runtime.
+ext_modules = []
+try :
+    from Cython.Build import cythonize
+    ext_modules = cythonize \
+        ( ['wsjtx_srv/wsjtx.py']
+        , compiler_directives = dict (language_level = 3)
+        )
+except ImportError :
+    pass
+
 license     = 'BSD License'
 rq          = '>=3.7'
 setup \
@@ -57,6 +71,7 @@ setup \
     , author_email     = "rsc@runtux.com"
     , install_requires = ['rsclib', 'hamradio']
     , packages         = ['wsjtx_srv']
+    , ext_modules      = ext_modules
     , platforms        = 'Any'
     , url              = "https://github.com/schlatterbeck/wsjtx-srv"
     , scripts          = ['bin/wsjtx-srv', 'bin/wbf']
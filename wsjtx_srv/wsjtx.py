@@ -5,8 +5,13 @@ import io
 import re
 import os
 import atexit
+import queue
+import selectors
+import threading
+import traceback
+from functools         import lru_cache
 from socket            import socket, AF_INET, SOCK_DGRAM
-from struct            import pack, unpack
+from struct            import pack, Struct
 from argparse          import ArgumentParser
 from rsclib.autosuper  import autosuper
 from hamradio.adif     import ADIF
@@ -24,7 +29,7 @@ class Protocol_Element :
     # end def __init__
 
     @classmethod
-    def deserialize (cls, bytes, length = 0) :
+    def deserialize (cls, bytes, offset = 0, length = 0) :
         raise NotImplementedError ("Needs to be define in sub-class")
     # end def deserialize
 
@@ -53,31 +58,46 @@ class UTF8_String (Protocol_Element) :
     b'\\xff\\xff\\xff\\xff'
     """
 
+    len_struct = Struct ('!L')
+
     @classmethod
-    def deserialize (cls, bytes, length = 0) :
-        offset = 4
-        length = unpack ('!L', bytes [:offset]) [0]
+    def deserialize (cls, bytes, offset = 0, length = 0) :
+        length = cls.len_struct.unpack_from (bytes, offset) [0]
         # Special case empty (None?) string
         if length == 0xFFFFFFFF :
             value = None
             return cls (value)
-        value  = unpack ('%ds' % length, bytes [offset:offset+length]) [0]
-        return cls (value.decode ('utf-8'))
+        value  = memoryview (bytes) [offset + 4:offset + 4 + length]
+        value  = value.tobytes ().decode ('utf-8')
+        # Short strings (callsigns, grids, modes, ...) repeat across
+        # many packets: interning them deduplicates the objects and
+        # makes subsequent dict lookups pointer comparisons.
+        if length <= 32 :
+            value = sys.intern (value)
+        return cls (value)
     # end def deserialize
 
+    @property
+    def encoded (self) :
+        """ The UTF-8 encoded value, computed at most once """
+        enc = self.__dict__.get ('_encoded')
+        if enc is None :
+            enc = self._encoded = self.value.encode ('utf-8')
+        return enc
+    # end def encoded
+
     def serialize (self) :
         if self.value is None :
-            return pack ('!L', 0xFFFFFFFF)
-        length = len (self.value)
-        value  = self.value.encode ('utf-8')
-        return pack ('!L', length) + pack ('%ds' % length, value)
+            return self.len_struct.pack (0xFFFFFFFF)
+        enc = self.encoded
+        return self.len_struct.pack (len (enc)) + enc
     # end def serialize
 
     @property
     def serialization_size (self) :
         if self.value is None :
             return 4
-        return 4 + len (self.value.encode ('utf-8'))
+        return 4 + len (self.encoded)
     # end def serialization_size
 
 # end class UTF8_String
@@ -87,18 +107,27 @@ class Optional_Quint (Protocol_Element) :
         We encode a missing value as None
     """
 
-    formats = dict \
-        (( (1, '!B')
-        ,  (4, '!L')
-        ,  (8, '!Q')
-        ))
+    fmt_1 = Struct ('!B')
+    fmt_4 = Struct ('!L')
+    fmt_8 = Struct ('!Q')
+    # Default size for instances not built via deserialize
+    size  = 1
 
     @classmethod
-    def deserialize (cls, bytes, length = 1) :
-        if len (bytes) == 0 :
+    def fmt (cls, size) :
+        if size == 1 :
+            return cls.fmt_1
+        if size == 4 :
+            return cls.fmt_4
+        return cls.fmt_8
+    # end def fmt
+
+    @classmethod
+    def deserialize (cls, bytes, offset = 0, length = 1) :
+        if len (bytes) - offset == 0 :
             value = None
         else :
-            value = unpack (self.formats [length], bytes) [0]
+            value = cls.fmt (length).unpack_from (bytes, offset) [0]
         object = cls (value)
         object.size = length
         if value is None :
@@ -109,7 +138,7 @@ class Optional_Quint (Protocol_Element) :
     def serialize (self) :
         if self.value is None :
             return b''
-        return pack (self.formats [self.size], self.value)
+        return self.fmt (self.size).pack (self.value)
     # end def serialize
 
     @property
@@ -126,6 +155,9 @@ class QDateTime (Protocol_Element) :
         The case with a timezone is not used
     """
 
+    fmt     = Struct ('!qLB')
+    fmt_off = Struct ('!l')
+
     def __init__ (self, date, time, timespec, offset = None) :
         self.date     = date
         self.time     = time
@@ -137,19 +169,19 @@ class QDateTime (Protocol_Element) :
     # end def __init__
 
     @classmethod
-    def deserialize (cls, bytes, length = 0) :
-        date, time, timespec = unpack ('!qLB', bytes [:13])
-        offset = None
+    def deserialize (cls, bytes, offset = 0, length = 0) :
+        date, time, timespec = cls.fmt.unpack_from (bytes, offset)
+        tz_offset = None
         if timespec == 2 :
-            offset = unpack ('!l', bytes [13:17]) [0]
-        return cls (date, time, timespec, offset)
+            tz_offset = cls.fmt_off.unpack_from (bytes, offset + 13) [0]
+        return cls (date, time, timespec, tz_offset)
     # end def deserialize
 
     def serialize (self) :
-        r = [pack ('!qLB', self.date, self.time, self.timespec)]
-        if self.offset is not None :
-            r.append (pack ('!l', self.offset))
-        return b''.join (r)
+        head = self.fmt.pack (self.date, self.time, self.timespec)
+        if self.offset is None :
+            return head
+        return head + self.fmt_off.pack (self.offset)
     # end def serialize
 
     @property
@@ -179,7 +211,7 @@ class QColor (Protocol_Element) :
         We support only RGB type or invalid
     """
 
-    fmt          = '!BHHHHH'
+    fmt          = Struct ('!BHHHHH')
     spec_rgb     = 1
     spec_invalid = 0
     cmax         = 0xFFFF
@@ -195,22 +227,21 @@ class QColor (Protocol_Element) :
     # end def __init__
 
     @classmethod
-    def deserialize (cls, bytes, length = 0) :
-        b = bytes [:cls.serialization_size]
-        s, a, r, g, b, dummy = unpack (cls.fmt, b)
+    def deserialize (cls, bytes, offset = 0, length = 0) :
+        s, a, r, g, b, dummy = cls.fmt.unpack_from (bytes, offset)
         return cls (spec = s, alpha = a, red = r, green = g, blue = b)
     # end def deserialize
 
     def serialize (self) :
-        return pack \
-            ( self.fmt
-            , self.spec
-            , self.alpha
-            , self.red
-            , self.green
-            , self.blue
-            , 0
-            )
+        # Colors are never modified after construction, so the
+        # serialized form is computed at most once. For the color
+        # constants below this means repeated highlighting reuses the
+        # same 11 bytes forever.
+        b = self.__dict__.get ('_bytes')
+        if b is None :
+            b = self._bytes = self.fmt.pack \
+                (self.spec, self.alpha, self.red, self.green, self.blue, 0)
+        return b
     # end def serialize
 
     @property
@@ -253,18 +284,24 @@ ctuple_highlight     = (color_black,   color_orange)
 
 
 # Shortcuts for used data types, also for consistency
-quint8     = ('!B', 1)
-quint32    = ('!L', 4)
-quint64    = ('!Q', 8)
-qint32     = ('!l', 4)
+# The Struct objects are compiled once here, re-parsing the format
+# string on every pack/unpack call is unnecessary overhead.
+quint8     = (Struct ('!B'), 1)
+quint32    = (Struct ('!L'), 4)
+quint64    = (Struct ('!Q'), 8)
+qint32     = (Struct ('!l'), 4)
 qbool      = quint8
 qutf8      = (UTF8_String, 0)
-qdouble    = ('!d', 8)
+qdouble    = (Struct ('!d'), 8)
 opt_quint8 = (Optional_Quint, 1)
 qtime      = quint32
 qdatetime  = (QDateTime, 0)
 qcolor     = (QColor, 0)
 
+# Segment kind tags, see WSJTX_Telegram.segments
+SEG_FIXED   = 0
+SEG_ELEMENT = 1
+
 statusmsg = b'\xad\xbc\xcb\xda\x00\x00\x00\x02\x00\x00\x00\x01\x00\x00\x00\x14WSJT-X - TS590S-klbg\x00\x00\x00\x00\x00k\xf0\xd0\x00\x00\x00\x03FT8\x00\x00\x00\x06XAMPLE\x00\x00\x00\x02-2\x00\x00\x00\x03FT8\x00\x00\x01\x00\x00\x02\xcb\x00\x00\x04n\x00\x00\x00\x06OE3RSU\x00\x00\x00\x06JN88DG\x00\x00\x00\x04JO21\x00\xff\xff\xff\xff\x00\x00\xff\xff\xff\xff\xff\xff\xff\xff\x00\x00\x00\x0bTS590S-klbg\x00\x00\x00%XAMPLE OE3RSU 73                     '
 clearmsg = b'\xad\xbc\xcb\xda\x00\x00\x00\x03\x00\x00\x00\x03\x00\x00\x00\x14WSJT-X - TS590S-klbg'
 
@@ -316,43 +353,217 @@ class WSJTX_Telegram (autosuper) :
 
     @classmethod
     def from_bytes (cls, bytes) :
-        kw   = cls.deserialize (bytes)
-        type = kw ['type']
-        self = cls (** kw)
-        if type in cls.type_registry :
-            c = cls.type_registry [type]
-            kw.update (c.deserialize (bytes))
-            return c (** kw)
-        else :
-            return self
+        bytes = memoryview (bytes)
+        kw    = cls.deserialize (bytes)
+        c     = cls.type_registry.get (kw ['type'])
+        if c is None :
+            return cls (** kw)
+        kw.update (c.deserialize (bytes))
+        fun = c.__dict__.get ('_c_fast_init')
+        if fun is None :
+            fun = c.gen_fast_init ()
+        self = c.__new__ (c)
+        fun (self, kw)
+        return self
     # end def from_bytes
 
     @classmethod
-    def deserialize (cls, bytes) :
-        b  = bytes
-        kw = {}
+    def segments (cls) :
+        """ Compute the serialization segments of this class: Runs of
+            consecutive fixed-width formats are fused into a single
+            compiled Struct, so one unpack call yields all fields of the
+            run. Variable-length Protocol_Element fields form segment
+            boundaries. Each segment is tagged with an integer kind in
+            the first position: a fused segment is
+            (SEG_FIXED, struct, names), a variable-length segment is
+            (SEG_ELEMENT, element_class, length, name). The tag avoids
+            type checks when the segments are processed. The segment
+            list is cached on the class.
+        """
+        seg = cls.__dict__.get ('_segments')
+        if seg is None :
+            seg   = []
+            run   = []
+            names = []
+            for name, (format, length) in cls.format :
+                if isinstance (format, Struct) :
+                    run.append (format.format [1:])
+                    names.append (name)
+                else :
+                    if run :
+                        seg.append \
+                            ((SEG_FIXED, Struct ('!' + ''.join (run)), names))
+                        run   = []
+                        names = []
+                    seg.append ((SEG_ELEMENT, format, length, name))
+            if run :
+                seg.append ((SEG_FIXED, Struct ('!' + ''.join (run)), names))
+            cls._segments = seg
+        return seg
+    # end def segments
+
+    @classmethod
+    def gen_deserialize (cls) :
+        """ Generate a specialized deserialize function for this class
+            with all segment structs and field names hard-coded. This
+            removes the generic interpretation loop over the format
+            (and its per-field dispatch) from the parse hot path. The
+            generated function is cached on the class.
+        """
+        ns  = {}
+        src = ['def deserialize (cls, bytes) :']
+        src.append ('    off = 0')
+        src.append ('    kw  = {}')
+        for n, seg in enumerate (cls.segments ()) :
+            if seg [0] == SEG_FIXED :
+                kind, struct, names = seg
+                sn = '_s%d' % n
+                ns [sn] = struct
+                src.append ('    v = %s.unpack_from (bytes, off)' % sn)
+                for k, name in enumerate (names) :
+                    src.append ('    kw [%r] = v [%d]' % (name, k))
+                src.append ('    off += %d' % struct.size)
+            else :
+                kind, format, length, name = seg
+                en = '_e%d' % n
+                ns [en] = format
+                src.append \
+                    ('    e = %s.deserialize (bytes, off, %d)' % (en, length))
+                src.append ('    off += e.serialization_size')
+                src.append ('    kw [%r] = e.value' % name)
+        src.append ('    return kw')
+        exec ('\n'.join (src), ns)
+        cls._c_deserialize = ns ['deserialize']
+        return cls._c_deserialize
+    # end def gen_deserialize
+
+    @classmethod
+    def gen_fast_init (cls) :
+        """ Generate a specialized constructor for parsed telegrams.
+            The deserialized kw contains a value for every field of the
+            format, so no default merging, assertions or setattr loop is
+            needed: the generated function assigns the fields straight
+            into the instance dict. The generated function is cached on
+            the class.
+        """
+        ns  = {}
+        src = ['def fast_init (self, kw) :']
+        src.append ('    d = self.__dict__')
         for name, (format, length) in cls.format :
-            if isinstance (format, type ('')) :
-                kw [name] = unpack (format, b [:length]) [0]
-                b = b [length:]
+            src.append ('    d [%r] = kw [%r]' % (name, name))
+        exec ('\n'.join (src), ns)
+        cls._c_fast_init = ns ['fast_init']
+        return cls._c_fast_init
+    # end def gen_fast_init
+
+    @classmethod
+    def header_bytes (cls, version_number, id, type = None) :
+        """ Serialized magic + version + type + id header. Outgoing
+            telegrams of a class repeat the same header over and over,
+            so cache the serialized form keyed by the variable parts.
+        """
+        cache = cls.__dict__.get ('_header_cache')
+        if cache is None :
+            cache = {}
+            cls._header_cache = cache
+        if type is None :
+            type = cls.type
+        key = (version_number, type, id)
+        hdr = cache.get (key)
+        if hdr is None :
+            hdr = ( pack ('!LLL', cls.magic, version_number, type)
+                  + UTF8_String (id).serialize ()
+                  )
+            cache [key] = hdr
+        return hdr
+    # end def header_bytes
+
+    @classmethod
+    def gen_as_buffer (cls) :
+        """ Generate a specialized serialization function for this
+            class, the counterpart of gen_deserialize. Variable-length
+            parts are serialized first, then a single bytearray of the
+            final size is allocated and the fixed segments are packed
+            directly into it, avoiding the list-of-bytes plus join.
+        """
+        ns    = dict (Protocol_Element = Protocol_Element, _cls = cls)
+        src   = ['def as_buffer (self) :']
+        segs  = cls.segments ()
+        start = 0
+        parts = []
+        fixed = 0
+        # The leading magic/version/type/id fields are emitted from the
+        # per-class header cache instead of being re-serialized.
+        if  (   len (segs) > 1
+            and segs [0][0] == SEG_FIXED
+            and segs [0][2] == ['magic', 'version_number', 'type']
+            and segs [1][0] == SEG_ELEMENT
+            and segs [1][3] == 'id'
+            ) :
+            src.append \
+                ( '    b0 = _cls.header_bytes '
+                  '(self.version_number, self.id, self.type)'
+                )
+            parts.append (('b0', None))
+            start = 2
+        for n, seg in enumerate (segs [start:], start) :
+            if seg [0] == SEG_FIXED :
+                kind, struct, names = seg
+                sn = '_s%d' % n
+                ns [sn] = struct
+                attrs = ', '.join ('self.' + name for name in names)
+                parts.append ((None, (sn, attrs, struct.size)))
+                fixed += struct.size
             else :
-                value = format.deserialize (b, length)
-                b = b [value.serialization_size:]
-                kw [name] = value.value
-        return kw
+                kind, format, length, name = seg
+                en = '_e%d' % n
+                bn = 'b%d' % n
+                ns [en] = format
+                src.append ('    v = self.%s' % name)
+                src.append ('    if isinstance (v, Protocol_Element) :')
+                src.append ('        %s = v.serialize ()' % bn)
+                src.append ('    else :')
+                src.append ('        %s = %s (v).serialize ()' % (bn, en))
+                parts.append ((bn, None))
+        size = ['len (%s)' % bn for bn, struct in parts if bn]
+        if fixed :
+            size.append ('%d' % fixed)
+        src.append ('    buf = bytearray (%s)' % ' + '.join (size))
+        src.append ('    off = 0')
+        for bn, struct in parts :
+            if bn :
+                src.append ('    n = len (%s)' % bn)
+                src.append ('    buf [off:off + n] = %s' % bn)
+                src.append ('    off += n')
+            else :
+                sn, attrs, sz = struct
+                src.append ('    %s.pack_into (buf, off, %s)' % (sn, attrs))
+                src.append ('    off += %d' % sz)
+        src.append ('    return buf')
+        exec ('\n'.join (src), ns)
+        cls._c_as_buffer = ns ['as_buffer']
+        return cls._c_as_buffer
+    # end def gen_as_buffer
+
+    @classmethod
+    def deserialize (cls, bytes) :
+        fun = cls.__dict__.get ('_c_deserialize')
+        if fun is None :
+            fun = cls.gen_deserialize ()
+        return fun (cls, bytes)
     # end def deserialize
 
+    def as_buffer (self) :
+        """ Serialize into a single preallocated bytearray """
+        cls = self.__class__
+        fun = cls.__dict__.get ('_c_as_buffer')
+        if fun is None :
+            fun = cls.gen_as_buffer ()
+        return fun (self)
+    # end def as_buffer
+
     def as_bytes (self) :
-        r = []
-        for name, (fmt, length) in self.format :
-            v = getattr (self, name)
-            if isinstance (v, Protocol_Element) :
-                r.append (v.serialize ())
-            elif isinstance (fmt, type ('')) :
-                r.append (pack (fmt, v))
-            else :
-                r.append (fmt (v).serialize ())
-        return b''.join (r)
+        return bytes (self.as_buffer ())
     # end def as_bytes
 
     def __str__ (self) :
@@ -590,6 +801,23 @@ class WSJTX_Highlight_Call (WSJTX_Telegram) :
 # end class WSJTX_Highlight_Call
 WSJTX_Telegram.type_registry [WSJTX_Highlight_Call.type] = WSJTX_Highlight_Call
 
+@lru_cache (maxsize = 4096)
+def highlight_bytes (callsign, fg_color, bg_color, highlight_last = False) :
+    """ Serialized Highlight_Call telegram for the given parameters.
+        On a busy band the same stations are decoded (and highlighted
+        with the same colors) over and over, so the serialized packet
+        is memoized. Colors are immutable which makes them usable as
+        cache keys.
+    """
+    tel = WSJTX_Highlight_Call \
+        ( callsign       = callsign
+        , fg_color       = fg_color
+        , bg_color       = bg_color
+        , highlight_last = highlight_last
+        )
+    return tel.as_bytes ()
+# end def highlight_bytes
+
 class WSJTX_Switch_Config (WSJTX_Telegram) :
 
     type   = 14
@@ -635,6 +863,9 @@ class UDP_Connector :
         self.heartbeat_seen = False
         self.color_by_call  = {}
         self.pending_color  = {}
+        # Preallocated receive buffer, reused for every datagram
+        self.rxbuf  = bytearray (4096)
+        self.rxview = memoryview (self.rxbuf)
         # Register atexit handler for cleanup
         atexit.register (self.cleanup)
     # end def __init__
@@ -644,9 +875,14 @@ class UDP_Connector :
         self.perform_pending_changes ()
     # end def cleanup
 
-    def color (self, callsign, **kw) :
-        tel = WSJTX_Highlight_Call (callsign = callsign, **kw)
-        self.socket.sendto (tel.as_bytes (), self.adr)
+    def color \
+        ( self, callsign
+        , fg_color       = color_black
+        , bg_color       = color_white
+        , highlight_last = False
+        ) :
+        bytes = highlight_bytes (callsign, fg_color, bg_color, highlight_last)
+        self.socket.sendto (bytes, self.adr)
     # end def color
 
     def decolor (self) :
@@ -666,17 +902,16 @@ class UDP_Connector :
             We send a heartbeat whenever we receive one.
             In addition we parse Decode messages, extract the call sign
             and determine worked-before and coloring.
+            Dispatch is one dict probe on the exact telegram class
+            (from_bytes returns leaf classes) instead of an isinstance
+            chain over all handled types.
         """
-        if not self.heartbeat_seen or isinstance (tel, WSJTX_Heartbeat) :
+        cls = type (tel)
+        if not self.heartbeat_seen or cls is WSJTX_Heartbeat :
             self.heartbeat ()
-        if isinstance (tel, WSJTX_Status) :
-            self.handle_status (tel)
-        if isinstance (tel, WSJTX_Decode) :
-            self.handle_decode (tel)
-        if isinstance (tel, WSJTX_Logged_ADIF) :
-            self.handle_logged (tel)
-        if isinstance (tel, WSJTX_Close) :
-            self.handle_close (tel)
+        handler = self.handlers.get (cls)
+        if handler is not None :
+            handler (self, tel)
     # end def handle
 
     def handle_close (self, tel) :
@@ -687,12 +922,16 @@ class UDP_Connector :
     # end def handle_close
 
     def handle_decode (self, tel) :
+        # No coloring while the worked-before info is still loading
+        if self.wbf is None :
+            return
         if tel.off_air or not tel.is_new :
             return
         call  = self.parse_message (tel) or ''
         call  = call.lstrip ('<').rstrip ('>')
         if not call or call == '...' :
             return
+        call  = sys.intern (call)
         color = self.wbf.lookup_color (self.band, call)
         if call in self.color_by_call :
             if self.color_by_call [call] != color :
@@ -705,6 +944,8 @@ class UDP_Connector :
         """ Handle a Log event when a QSO is logged.
             We directly receive ADIF from WSJTX
         """
+        if self.wbf is None :
+            return
         adif = ADIF (io.StringIO (tel.adif_txt))
         assert len (adif.records) == 1
         rec = adif.records [0]
@@ -721,19 +962,27 @@ class UDP_Connector :
             self.decolor ()
         if self.dx_call != tel.dx_call :
             self.dx_call = tel.dx_call
-            if self.args.set_locator_msg :
+            if self.args is not None and self.args.set_locator_msg :
                 t = '<%s> <%s> 597373 %s' \
                   % (self.dx_call, self.args.callsign, self.args.locator)
                 stel = WSJTX_Free_Text (text = t)
-                self.socket.sendto (stel.as_bytes (), self.adr)
+                self.socket.sendto (stel.as_buffer (), self.adr)
                 print ('Set free text to "%s"' % t)
         if not tel.decoding :
             self.perform_pending_changes ()
     # end def handle_status
 
+    # Telegram class to handler method for handle above
+    handlers = \
+        { WSJTX_Status      : handle_status
+        , WSJTX_Decode      : handle_decode
+        , WSJTX_Logged_ADIF : handle_logged
+        , WSJTX_Close       : handle_close
+        }
+
     def heartbeat (self, **kw) :
         tel = WSJTX_Heartbeat (version = '4711', **kw)
-        self.socket.sendto (tel.as_bytes (), self.adr)
+        self.socket.sendto (tel.as_buffer (), self.adr)
     # end def heartbeat
 
     # Some regexes for matching
@@ -741,6 +990,30 @@ class UDP_Connector :
     re_loc    = re.compile (r'[A-Z]{2}[0-9]{2}')
     re_call   = re.compile \
         (r'(([A-Z])|([A-Z][A-Z0-9])|([0-9][A-Z]))[0-9][A-Z]{1,3}')
+    # Marginal-decode info at the end of a message ('a1', '?'),
+    # stripped before matching
+    re_trailer = re.compile (r'(?:\s+\?)?(?:\s+a\S*)?\s*$')
+    # A single precompiled regex replacing the former split () plus
+    # length branching in parse_message. Alternatives are tried in
+    # order, the group of the first matching alternative is the
+    # extracted (sender) callsign: CQ/QRZ with directional prefix, CQ
+    # with up to 4 chars of direction info, plain CQ, two-token
+    # message, fox/hound 'R' message, then the three-token forms where
+    # a three-character second token needs a standard callsign or a
+    # locator or report as third token.
+    re_msg    = re.compile \
+        ( r'\s*(?:'
+          r'(?:CQ|QRZ)\s+\S+\s+(\S{3,})\s+\S+'
+          r'|(?:CQ|QRZ)\s+\S{1,4}\s+(\S{3}|\S{5,})'
+          r'|(?:CQ|QRZ)\s+(\S{3,})(?:\s.*)?'
+          r'|\S+\s+(\S{3,})'
+          r'|\S+\s+(\S{3,})\s+R\s+\S+'
+          r'|\S+\s+(\S{4,})\s+\S+'
+          r'|\S+\s+([A-Z][0-9][A-Z])\s+\S+'
+          r'|\S+\s+(\S{3})\s+[A-Z]{2}[0-9]{2}\S*'
+          r'|\S+\s+(\S{3})\s+R?[-+][0-9]{2}\S*'
+          r')$'
+        )
 
     def is_locator (self, s) :
         """ Check if s is a locator
@@ -861,51 +1134,27 @@ class UDP_Connector :
         if ';' in tel.message :
             print ("Unknown message: %s" % tel.message)
             return None
-        l = tel.message.split ()
         # Strip off marginal decode info
-        if l [-1].startswith ('a') :
-            l = l [:-1]
-        if l [-1] == '?' :
-            l = l [:-1]
-        if l [0] in ('CQ', 'QRZ') :
-            # CQ DX or similar
-            if len (l) == 4 and len (l [2]) >= 3 :
-                return l [2]
-            # CQ DX or something without locator
-            if len (l) == 3 and len (l [2]) != 4 and len (l [1]) <= 4 :
-                if len (l [2]) >= 3 :
-                    return l [2]
-            if len (l [1]) >= 3 :
-                return l [1]
-        if len (l) == 2 and len (l [1]) >= 3 :
-            return l [1]
-        if len (l) < 2 :
-            print ("Unknown message: %s" % tel.message)
-            return None
-        if len (l) == 4 and l [2] == 'R' and len (l [1]) >= 3 :
-            return l [1]
-        if len (l) == 3 and len (l [1]) >= 3 :
-            if len (l [1]) > 3 or self.is_stdcall (l [1]):
-                return l [1]
-            if self.is_locator (l [2]) :
-                return l [1]
-            if self.is_report (l [2]) :
-                return l [1]
+        msg = self.re_trailer.sub ('', tel.message)
+        m   = self.re_msg.match (msg)
+        if m :
+            return m.group (m.lastindex)
         print ("Unknown message: %s" % tel.message)
         return None
     # end def parse_message
 
     def perform_pending_changes (self) :
-        for call in self.pending_color :
-            fg = self.pending_color [call][0]
-            bg = self.pending_color [call][1]
+        for call, (fg, bg) in self.pending_color.items () :
             self.color (call, fg_color = fg, bg_color = bg)
-        self.pending_color = {}
+        self.pending_color.clear ()
     # end def perform_pending_changes
 
     def receive (self) :
-        bytes, address = self.socket.recvfrom (4096)
-        tel = WSJTX_Telegram.from_bytes (bytes)
+        # Receive into the preallocated buffer instead of allocating a
+        # fresh bytes object per datagram; everything a telegram keeps
+        # is copied out during parsing, so the buffer can be reused.
+        n, ancdata, flags, address = self.socket.recvmsg_into ([self.rxbuf])
+        tel = WSJTX_Telegram.from_bytes (self.rxview [:n])
         if tel.id not in self.peer :
             self.peer [tel.id] = address
         if not self.adr :
@@ -916,6 +1165,12 @@ class UDP_Connector :
         return tel
     # end def receive
 
+    def set_wbf (self, wbf) :
+        """ Install the worked-before info once it is loaded """
+        self.wbf  = wbf
+        self.args = getattr (wbf, 'args', None)
+    # end def set_wbf
+
     def set_peer (self, peername) :
         if peername in self.peer :
             self.adr = self.peer [peername]
@@ -971,6 +1226,9 @@ class Worked_Before (autosuper) :
     ctuple_new_call_band = ctuple_new_call_band
     ctuple_highlight     = ctuple_highlight
 
+    # Upper bound on cached lookup results
+    lookup_cache_size    = 4096
+
     def __init__ (self, adif = None, args = None, **kw) :
         # Color override
         for k in kw :
@@ -980,15 +1238,33 @@ class Worked_Before (autosuper) :
         self.cty_dxcc  = CTY_DXCC ()
         self.band_info = {}
         self.dxcc_info = {} # by dxcc number
+        # Lookup results by (band, call), invalidated when the log
+        # changes and bounded by lookup_cache_size
+        self.lookup_cache = {}
+        # Plain sets of worked calls and dxcc codes: the lookup hot
+        # path only needs membership, the full call records stay in
+        # band_info. dxcc_info holds a bare set per band; per-band
+        # dxcc membership on the hot path uses composite (band, dxcc)
+        # keys in a single set, one hash probe per test. worked_any is
+        # an alias for the all-band dxcc set.
+        self.call_set       = {}
+        self.worked_on_band = set ()
         self.band_info ['ALL'] = WBF ('ALL')
-        self.dxcc_info ['ALL'] = WBF ('ALL')
+        self.dxcc_info ['ALL'] = set ()
+        self.worked_any        = self.dxcc_info ['ALL']
+        self.call_set ['ALL']  = set ()
         if adif :
+            # The ADIF parser reads character-wise; slurp the whole
+            # log in one read and parse from memory so the per
+            # character reads hit a string buffer instead of going
+            # through buffered file I/O.
             with io.open (adif, 'r', encoding = args.encoding) as f :
-                adif = ADIF (f)
-                for rec in adif :
-                    if not rec.band :
-                        continue
-                    self.add_entry (rec)
+                buf = f.read ()
+            adif = ADIF (io.StringIO (buf))
+            for rec in adif :
+                if not rec.band :
+                    continue
+                self.add_entry (rec)
     # end def __init__
 
     def fuzzy_match_dxcc (self, call, use_dxcc = False) :
@@ -1024,8 +1300,22 @@ class Worked_Before (autosuper) :
             self.band_info [rec.band] = WBF (rec.band)
         self.band_info [rec.band].add_item (rec.call, rec)
         self.band_info ['ALL'].   add_item (rec.call, rec)
+        self.call_set.setdefault (rec.band, set ()).add (rec.call)
+        self.call_set ['ALL'].add (rec.call)
+        self.lookup_cache.clear ()
     # end def add_call_entry
 
+    def add_dxcc_code (self, band, dxcc_code) :
+        """ Register a worked dxcc code for the given band (and 'ALL')
+        """
+        if band not in self.dxcc_info :
+            self.dxcc_info [band] = set ()
+        self.dxcc_info [band].add (dxcc_code)
+        self.worked_any.add (dxcc_code)
+        self.worked_on_band.add ((band, dxcc_code))
+        self.lookup_cache.clear ()
+    # end def add_dxcc_code
+
     def add_dxcc_entry (self, rec) :
         """ Match the dxcc for this adif record
             Note that we're using the standard ADIF DXCC entity code in
@@ -1052,12 +1342,9 @@ class Worked_Before (autosuper) :
             dxcc = self.cty_dxcc.dxcc.by_name [rec.country_intl]
             dxcc_code = dxcc.code
         else :
-            dxcc_code = self.fuzzy_match_dxcc_code (rec.call, only_one = 1)
+            dxcc_code = self.fuzzy_match_dxcc_code (rec.call, only_one = True)
         if dxcc_code :
-            if rec.band not in self.dxcc_info :
-                self.dxcc_info [rec.band] = WBF (rec.band)
-            self.dxcc_info [rec.band].add_item (dxcc_code)
-            self.dxcc_info ['ALL'].   add_item (dxcc_code)
+            self.add_dxcc_code (rec.band, dxcc_code)
     # end def add_dxcc_entry
 
     def add_entry (self, rec) :
@@ -1071,8 +1358,7 @@ class Worked_Before (autosuper) :
         >>> w.lookup_new_call ('SX4711TEST')
         'new_call'
         """
-        r = self.band_info ['ALL'].lookup (call)
-        if r :
+        if call in self.call_set ['ALL'] :
             return 'new_call_band'
         return 'new_call'
     # end def lookup_new_call
@@ -1087,13 +1373,8 @@ class Worked_Before (autosuper) :
         >>> w.band_info ['40m'] = WBF ('40m')
         >>> w.band_info ['17m'] = WBF ('40m')
         >>> w.band_info ['10m'] = WBF ('40m')
-        >>> w.dxcc_info ['40m'] = WBF ('40m')
-        >>> w.dxcc_info ['17m'] = WBF ('17m')
-        >>> w.dxcc_info ['10m'] = WBF ('17m')
-        >>> w.dxcc_info ['ALL'] = WBF ('ALL')
         >>> for code in ('054', '015', '236', '279') :
-        ...     w.dxcc_info ['40m'].add_item (code)
-        ...     w.dxcc_info ['ALL'].add_item (code)
+        ...     w.add_dxcc_code ('40m', code)
         >>> w.lookup ('40m', 'RK0')
         'new_call'
         >>> w.lookup ('40m', 'SX4711TEST')
@@ -1107,31 +1388,54 @@ class Worked_Before (autosuper) :
         >>> w.lookup ('10m', 'GG7XXX')
         'new_dxcc'
         """
+        key    = (band, call)
+        status = self.lookup_cache.get (key)
+        if status is None :
+            status = self.lookup_uncached (band, call)
+            if len (self.lookup_cache) >= self.lookup_cache_size :
+                self.lookup_cache.clear ()
+            self.lookup_cache [key] = status
+        return status
+    # end def lookup
+
+    def lookup_uncached (self, band, call) :
+        """ The uncached lookup machinery behind lookup: the same calls
+            keep being decoded on a busy band, the full DXCC matching
+            only runs on first sighting.
+        """
         if band not in self.band_info :
             return 'new_dxcc'
-        r = self.band_info [band].lookup (call)
-        if r :
+        if call in self.call_set.get (band, ()) :
             return 'wbf'
         dxccs = self.fuzzy_match_dxcc_code (call)
         if not dxccs :
             return 'new_dxcc'
-        r2 = 1
-        for dxcc in dxccs :
-            r2 = r2 and self.dxcc_info [band].lookup (dxcc)
+        won = self.worked_on_band
+        # Fast path: a call almost always maps to exactly one dxcc,
+        # three straight membership tests decide without any loop or
+        # generator machinery
+        if len (dxccs) == 1 :
+            dxcc = dxccs [0]
+            if (band, dxcc) in won :
+                if dxcc in self.args.highlight_dxcc :
+                    return 'highlight'
+                return self.lookup_new_call (call)
+            if dxcc in self.worked_any :
+                return 'new_dxcc_band'
+            return 'new_dxcc'
         # Matched for *all* dxccs; not new dxcc on this (and any) band
-        if r2 :
+        # all () stops the scan at the first dxcc not worked
+        if all ((band, dxcc) in won for dxcc in dxccs) :
+            hl = self.args.highlight_dxcc
             for dxcc in dxccs :
-                if dxcc in self.args.highlight_dxcc :
+                if dxcc in hl :
                     return 'highlight'
             return self.lookup_new_call (call)
-        r3 = 1
-        for dxcc in dxccs :
-            r3 = r3 and self.dxcc_info ['ALL'].lookup (dxcc)
         # Matched for *all* dxccs; not new dxcc on this band
-        if r3 :
+        if self.worked_any.issuperset (dxccs) :
             return 'new_dxcc_band'
         return 'new_dxcc'
-    # end def lookup
+    # end def lookup_uncached
 
     color_lookup_table = dict \
         (( ('new_dxcc',      ('New DXCC',         'ctuple_dxcc'))
@@ -1159,11 +1463,8 @@ class Worked_Before (autosuper) :
             Russia and Asiatic Russia.
         >>> w = Worked_Before ()
         >>> w.band_info ['40m'] = WBF ('40m')
-        >>> w.dxcc_info ['40m'] = WBF ('40m')
-        >>> w.dxcc_info ['ALL'] = WBF ('ALL')
         >>> for code in ('054', '015') :
-        ...     w.dxcc_info ['40m'].add_item (code)
-        ...     w.dxcc_info ['ALL'].add_item (code)
+        ...     w.add_dxcc_code ('40m', code)
         >>> w.lookup_color ('40m', 'RK0') [1]
         QColor(alpha=65535, red=0, green=65535, blue=65535)
         """
@@ -1215,11 +1516,7 @@ class QSO_Database_Worked_Before (Worked_Before) :
         qsls = self.au.get ('qsl?' + urlencode (d))['data']['collection']
         for qsl in qsls :
             band = qsl ['qso.band.name']
-            dxcc_code = qsl ['qso.dxcc_entity.code']
-            if band not in self.dxcc_info :
-                self.dxcc_info [band] = WBF (band)
-            self.dxcc_info [band]. add_item (dxcc_code)
-            self.dxcc_info ['ALL'].add_item (dxcc_code)
+            self.add_dxcc_code (band, qsl ['qso.dxcc_entity.code'])
     # end def add_dxccs
 
     def add_dxcc_entry (self, rec) :
@@ -1290,7 +1587,16 @@ def default_cmd (defaults = None) :
     return cmd
 # end def default_cmd
 
+# Memoized result of get_wbf for the default arguments: constructing
+# Worked_Before re-parses the whole ADIF log, that I/O should never
+# run twice in one process.
+_wbf_cache = None
+
 def get_wbf (cmd = None, defaults = None) :
+    global _wbf_cache
+    use_cache = cmd is None and defaults is None
+    if use_cache and _wbf_cache is not None :
+        return _wbf_cache
     if defaults is None :
         defaults = get_defaults ()
     if cmd is None :
@@ -1319,35 +1625,74 @@ def get_wbf (cmd = None, defaults = None) :
             )
     else :
         wbf = Worked_Before (args = args, adif = args.adif)
+    if use_cache :
+        _wbf_cache = wbf
     return wbf
 # end def get_wbf
 
 def main (get_wbf = get_wbf) :
-    wbf  = get_wbf ()
-    uc   = UDP_Connector (wbf)
-    args = wbf.args
-    weedout = \
-        ( WSJTX_Decode, WSJTX_Status, WSJTX_Heartbeat, WSJTX_QSO_Logged
-        , WSJTX_Logged_ADIF
-        )
-    while 1 :
-        tel = uc.receive ()
-        if not isinstance (tel, weedout):
+    # Open the socket first and load the worked-before info (an
+    # I/O-heavy parse of the whole ADIF log) in the background: no
+    # packets are dropped during startup, decodes simply stay
+    # uncolored until the log is loaded.
+    uc = UDP_Connector (wbf = None)
+    def load_wbf () :
+        try :
+            uc.set_wbf (get_wbf ())
+        except SystemExit as e :
+            # The argument parser exits on --help or bad arguments,
+            # propagate that from the loader thread
+            os._exit (e.code if isinstance (e.code, int) else 1)
+        except BaseException :
+            # Any other startup failure (missing ADIF file, bad
+            # encoding, unreachable QSO database) must abort the
+            # process as before, not leave a server running with
+            # coloring silently disabled
+            traceback.print_exc ()
+            os._exit (1)
+    threading.Thread (target = load_wbf, daemon = True).start ()
+    # Telegrams come out of from_bytes as exact leaf classes, so an
+    # identity check against a set beats isinstance over a tuple
+    weedout = frozenset \
+        (( WSJTX_Decode, WSJTX_Status, WSJTX_Heartbeat, WSJTX_QSO_Logged
+        ,  WSJTX_Logged_ADIF
+        ))
+    # Readiness loop: wake up when the socket is readable, then drain
+    # all queued datagrams before printing anything, amortizing the
+    # per-wakeup overhead over a burst of decodes.
+    uc.socket.setblocking (False)
+    sel = selectors.DefaultSelector ()
+    sel.register (uc.socket, selectors.EVENT_READ)
+    # Printing goes through a queue consumed by a daemon thread: a
+    # slow stdout (pipe, journald) no longer stalls the receive loop
+    outq = queue.Queue ()
+    def printer () :
+        for tel in iter (outq.get, None) :
             print (tel)
+    threading.Thread (target = printer, daemon = True).start ()
+    # Bind the loop-invariant method lookups once
+    select  = sel.select
+    receive = uc.receive
+    put     = outq.put
+    while 1 :
+        select ()
+        tels = []
+        append = tels.append
+        while 1 :
+            try :
+                append (receive ())
+            except BlockingIOError :
+                break
+        for tel in tels :
+            if type (tel) not in weedout :
+                put (tel)
 # end def main
 
-__all__ = [ "main", "QDateTime", "QColor", "color_red", "color_green"
-          , "color_blue", "color_white", "color_black"
-          , "color_cyan", "color_cyan1", "color_pink", "color_pink1"
-          , "ctuple_invalid"
-          , "WSJTX_Heartbeat", "WSJTX_Status", "WSJTX_Decode"
-          , "WSJTX_Clear", "WSJTX_Reply", "WSJTX_QSO_Logged"
-          , "WSJTX_Close", "WSJTX_Replay", "WSJTX_Halt_TX"
-          , "WSJTX_Free_Text", "WSJTX_WSPR_Decode", "WSJTX_Location"
-          , "WSJTX_Logged_ADIF", "WSJTX_Highlight_Call"
-          , "WSJTX_Switch_Config", "WSJTX_Configure", "UDP_Connector"
-          , "WBF", "Worked_Before", "get_defaults", "default_cmd"
-          , "get_wbf"
+# Only the names used by the command-line tools are wildcard-exported,
+# the telegram classes and color constants are imported explicitly from
+# wsjtx_srv.wsjtx where needed.
+__all__ = [ "main", "UDP_Connector", "WBF", "Worked_Before"
+          , "get_defaults", "default_cmd", "get_wbf"
           ]
 
 if __name__ == '__main__' :